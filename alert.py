@@ -3,8 +3,11 @@ PubMed 引用数検索システム — メール通知
 閾値超過論文のメール本文生成・Gmail SMTP 送信。
 """
 
+import io
 import smtplib
 import logging
+from html import escape as _esc
+from operator import itemgetter
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
@@ -13,21 +16,18 @@ from dictionary import get_impact_factor
 
 logger = logging.getLogger(__name__)
 
+# =========================================================
+# SMTP 設定
+# =========================================================
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+SMTP_MAX_MESSAGES_PER_CONNECTION = 100  # 1 接続あたりの最大送信数（超えたら再接続）
 
-def build_email_body(alerts: list[dict]) -> str:
-    """
-    アラートリストからHTML形式のメール本文を生成する。
-
-    Args:
-        alerts: アラートレコードの辞書リスト。各辞書は以下のキーを持つ:
-            - title, journal, published_date, pmid, doi,
-              citation_increase, summary (Gemini要約)
 
-    Returns:
-        HTML メール本文
-    """
-    html_parts = []
-    html_parts.append("""
+# =========================================================
+# メール本文テンプレート（% 書式。モジュール読み込み時に一度だけ定義）
+# =========================================================
+HEADER_HTML = """
     <html>
     <head>
     <meta charset="utf-8">
@@ -53,72 +53,216 @@ def build_email_body(alerts: list[dict]) -> str:
         <h1>📊 PubMed 引用数検索アラート</h1>
         <p>指定期間内に公開され、合計引用数が基準を超えた論文をお知らせします</p>
     </div>
-    """)
+    """
 
-    html_parts.append(f'<p style="padding: 10px 0; font-size: 14px;">検知された論文数: <strong>{len(alerts)} 件</strong></p>')
+COUNT_HTML_TEMPLATE = (
+    '\n<p style="padding: 10px 0; font-size: 14px;">'
+    '検知された論文数: <strong>%(count)d 件</strong></p>\n'
+)
 
-    for i, alert in enumerate(alerts, 1):
-        pmid = alert.get("pmid", "N/A")
-        doi = alert.get("doi", "N/A")
-        title = alert.get("title", "N/A")
-        journal = alert.get("journal", "N/A")
-        published_date = alert.get("published_date", "N/A")
-        increase = alert.get("citation_increase", 0)
-        summary = alert.get("summary", "（要約なし）")
-        impact_factor = get_impact_factor(journal)
-        pubmed_url = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-
-        html_parts.append(f"""
+ARTICLE_TEMPLATE = """
         <div class="article">
-            <h2>{i}. {title}</h2>
+            <h2>%(i)d. %(title)s</h2>
             <table class="meta-table">
-                <tr><td>ジャーナル</td><td>{journal}</td></tr>
-                <tr><td>インパクトファクター</td><td>{impact_factor}</td></tr>
-                <tr><td>公開日</td><td>{published_date}</td></tr>
-                <tr><td>PMID</td><td>{pmid}</td></tr>
-                <tr><td>DOI</td><td>{doi if doi else 'N/A'}</td></tr>
-                <tr><td>現在の合計引用数</td><td><span class="badge">{increase}</span></td></tr>
+                <tr><td>ジャーナル</td><td>%(journal)s</td></tr>
+                <tr><td>インパクトファクター</td><td>%(impact_factor)s</td></tr>
+                <tr><td>公開日</td><td>%(published_date)s</td></tr>
+                <tr><td>PMID</td><td>%(pmid)s</td></tr>
+                <tr><td>DOI</td><td>%(doi)s</td></tr>
+                <tr><td>現在の合計引用数</td><td><span class="badge">%(increase)d</span></td></tr>
             </table>
             <div class="summary">
                 <strong>📝 日本語要約:</strong><br>
-                {summary}
+                %(summary)s
             </div>
-            <p><a class="link" href="{pubmed_url}" target="_blank">🔗 PubMed で閲覧</a></p>
+            <p><a class="link" href="https://pubmed.ncbi.nlm.nih.gov/%(pmid)s/" target="_blank">🔗 PubMed で閲覧</a></p>
         </div>
-        """)
+        """
 
-    html_parts.append("""
+FOOTER_HTML = """
     <div class="footer">
         <p>このメールは PubMed 引用数検索システムにより自動送信されました。</p>
     </div>
     </body></html>
-    """)
+    """
 
-    return "\n".join(html_parts)
+PLAIN_HEADER_TEMPLATE = (
+    "PubMed 引用数検索アラート\n"
+    + "=" * 40 + "\n"
+    "検知された論文数: %(count)d 件\n"
+    "\n"
+)
 
+PLAIN_TEMPLATE = (
+    "--- 論文 %(i)d ---\n"
+    "タイトル: %(title)s\n"
+    "ジャーナル: %(journal)s\n"
+    "インパクトファクター: %(impact_factor)s\n"
+    "公開日: %(published_date)s\n"
+    "PMID: %(pmid)s\n"
+    "DOI: %(doi)s\n"
+    "現在の合計引用数: %(increase)d\n"
+    "\n"
+    "日本語要約:\n"
+    "%(summary)s\n"
+    "\n"
+    "PubMed: https://pubmed.ncbi.nlm.nih.gov/%(pmid)s/\n"
+    "\n"
+)
 
-def send_alert_email(alerts: list[dict]) -> bool:
+
+# HTML 版でエスケープする（外部データ由来の）フィールド
+_HTML_ESCAPED_KEYS = ("title", "journal", "published_date", "pmid", "doi", "summary")
+
+
+# テンプレートで使うアラートのキーと、欠けている場合の既定値
+_ALERT_DEFAULTS = {
+    "pmid": "N/A",
+    "doi": "N/A",
+    "title": "N/A",
+    "journal": "N/A",
+    "published_date": "N/A",
+    "citation_increase": 0,
+    "summary": "（要約なし）",
+}
+_ALERT_KEYS = _ALERT_DEFAULTS.keys()
+_get_fields = itemgetter(*_ALERT_DEFAULTS)
+
+
+def _template_values(i: int, alert: dict) -> dict:
+    """テンプレートに埋め込む値の辞書を組み立てる。"""
+    # DB から取得したレコードは全キーを持つため、欠けている場合のみ既定値で補う
+    if not _ALERT_KEYS <= alert.keys():
+        alert = {**_ALERT_DEFAULTS, **alert}
+    pmid, doi, title, journal, published_date, increase, summary = _get_fields(alert)
+    return {
+        "i": i,
+        "pmid": pmid,
+        "doi": doi or "N/A",
+        "title": title,
+        "journal": journal,
+        "published_date": published_date,
+        "increase": increase,
+        "summary": summary,
+        "impact_factor": get_impact_factor(journal),
+    }
+
+
+def build_email_body(alerts: list[dict]) -> str:
     """
-    アラートメールを Gmail SMTP で送信する。
+    アラートリストからHTML形式のメール本文を生成する。
 
     Args:
-        alerts: アラートレコードのリスト
+        alerts: アラートレコードの辞書リスト。各辞書は以下のキーを持つ:
+            - title, journal, published_date, pmid, doi,
+              citation_increase, summary (Gemini要約)
 
     Returns:
-        True: 送信成功、 False: 送信失敗
+        HTML メール本文
     """
-    if not alerts:
-        logger.info("通知対象の論文がありません。メール送信をスキップします。")
-        return False
+    parts = [None] * (len(alerts) + 3)
+    parts[0] = HEADER_HTML
+    parts[1] = COUNT_HTML_TEMPLATE % {"count": len(alerts)}
 
-    if not config.GMAIL_ADDRESS or not config.GMAIL_APP_PASSWORD:
-        logger.error("Gmail 認証情報が設定されていません")
-        return False
+    for i, alert in enumerate(alerts, 1):
+        values = _template_values(i, alert)
+        # タイトル等に含まれる < & " でレイアウトが崩れないようエスケープする
+        for key in _HTML_ESCAPED_KEYS:
+            values[key] = _esc(str(values[key]), quote=True)
+        parts[i + 1] = ARTICLE_TEMPLATE % values
 
-    if not config.RECIPIENT_EMAIL:
-        logger.error("送信先メールアドレスが設定されていません")
-        return False
+    parts[-1] = FOOTER_HTML
+    return "".join(parts)
+
+
+class SMTPSession:
+    """
+    Gmail SMTP 接続を使い回すためのコンテキストマネージャ。
+
+    EHLO / STARTTLS / LOGIN は最初の送信時に一度だけ行い、以降の送信では
+    NOOP で接続の生存を確認してから同じ接続を再利用する。切断されていた
+    場合や、1 接続あたりの送信上限に達した場合は再接続する。
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT,
+                 max_messages: int = SMTP_MAX_MESSAGES_PER_CONNECTION):
+        self.host = host
+        self.port = port
+        self.max_messages = max_messages
+        self._server: smtplib.SMTP | None = None
+        self._sent = 0
+
+    def __enter__(self) -> "SMTPSession":
+        return self
 
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _connect(self) -> None:
+        """接続・TLS 開始・ログインを行う。"""
+        server = smtplib.SMTP(self.host, self.port)
+        try:
+            server.ehlo()
+            server.starttls()
+            server.ehlo()
+            server.login(config.GMAIL_ADDRESS, config.GMAIL_APP_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self._sent = 0
+        logger.debug("SMTP 接続を確立: %s:%s", self.host, self.port)
+
+    def _is_alive(self) -> bool:
+        """NOOP で接続が生きているか確認する。"""
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _ensure_connection(self) -> None:
+        if self._server is not None and self._sent >= self.max_messages:
+            logger.debug("SMTP 送信上限 (%d 通) に達したため再接続します", self.max_messages)
+            self.close()
+        elif self._server is not None and not self._is_alive():
+            logger.debug("SMTP 接続が切断されていたため再接続します")
+            self.close()
+
+        if self._server is None:
+            self._connect()
+
+    def send(self, msg: MIMEMultipart) -> None:
+        """
+        メッセージを送信する。切断を検知した場合は一度だけ再接続して再送する。
+
+        Raises:
+            smtplib.SMTPException: 送信に失敗した場合
+        """
+        self._ensure_connection()
+        try:
+            self._server.sendmail(msg["From"], msg["To"], msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            logger.warning("SMTP 接続が切断されました。再接続して再送します")
+            self.close()
+            self._connect()
+            self._server.sendmail(msg["From"], msg["To"], msg.as_string())
+        self._sent += 1
+
+    def close(self) -> None:
+        """接続を閉じる（QUIT に失敗しても例外は送出しない）。"""
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            self._server.close()
+        finally:
+            self._server = None
+            self._sent = 0
+
+
+def _build_message(alerts: list[dict]) -> MIMEMultipart:
+    """アラートリストから送信用のメールメッセージを組み立てる。"""
     html_body = build_email_body(alerts)
 
     msg = MIMEMultipart("alternative")
@@ -130,59 +274,81 @@ def send_alert_email(alerts: list[dict]) -> bool:
     text_body = _build_plain_text(alerts)
     msg.attach(MIMEText(text_body, "plain", "utf-8"))
     msg.attach(MIMEText(html_body, "html", "utf-8"))
+    return msg
 
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            server.login(config.GMAIL_ADDRESS, config.GMAIL_APP_PASSWORD)
-            server.sendmail(
-                config.GMAIL_ADDRESS,
-                config.RECIPIENT_EMAIL,
-                msg.as_string(),
-            )
-        logger.info(f"アラートメール送信完了: {config.RECIPIENT_EMAIL}")
-        return True
-    except smtplib.SMTPException as e:
-        logger.error(f"メール送信失敗: {e}")
+
+def send_alert_emails(batches: list[list[dict]]) -> bool:
+    """
+    複数のアラートバッチを、1 本の SMTP 接続を使い回して送信する。
+    空のバッチは送信しない。
+
+    Args:
+        batches: アラートレコードのリストのリスト（1 バッチ = 1 通）
+
+    Returns:
+        True: 全バッチの送信成功、 False: 1 件以上の送信失敗
+    """
+    batches = [alerts for alerts in batches if alerts]
+    if not batches:
+        logger.info("通知対象の論文がありません。メール送信をスキップします。")
+        return False
+
+    if not config.GMAIL_ADDRESS or not config.GMAIL_APP_PASSWORD:
+        logger.error("Gmail 認証情報が設定されていません")
+        return False
+
+    if not config.RECIPIENT_EMAIL:
+        logger.error("送信先メールアドレスが設定されていません")
         return False
 
+    success = True
+    with SMTPSession() as session:
+        for i, alerts in enumerate(batches):
+            try:
+                session.send(_build_message(alerts))
+                logger.info("アラートメール送信完了: %s (%d 件)", config.RECIPIENT_EMAIL, len(alerts))
+            except smtplib.SMTPAuthenticationError as e:
+                # 認証情報の誤りは再接続しても直らないため、残りのバッチは送信しない
+                logger.error("Gmail 認証に失敗しました。残り %d 通の送信を中止します: %s",
+                             len(batches) - i, e)
+                return False
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as e:
+                # 接続の問題は一時的な可能性があるため、次のバッチは接続し直して送る
+                logger.error("メール送信失敗（接続エラー）: %s", e)
+                session.close()
+                success = False
+            except smtplib.SMTPException as e:
+                # 受信者拒否などメッセージ単位の失敗は接続を使い続ける
+                # （SMTPException は OSError のサブクラスのため、OSError より先に捕捉する）
+                logger.error("メール送信失敗: %s", e)
+                success = False
+            except OSError as e:
+                # ソケットエラーも接続の問題として扱い、次のバッチは接続し直す
+                logger.error("メール送信失敗（接続エラー）: %s", e)
+                session.close()
+                success = False
+    return success
+
+
+def send_alert_email(alerts: list[dict]) -> bool:
+    """
+    アラートメールを Gmail SMTP で送信する。
+
+    Args:
+        alerts: アラートレコードのリスト
+
+    Returns:
+        True: 送信成功、 False: 送信失敗
+    """
+    return send_alert_emails([alerts])
+
 
 def _build_plain_text(alerts: list[dict]) -> str:
     """プレーンテキスト版のメール本文を生成する。"""
-    lines = [
-        "PubMed 引用数検索アラート",
-        "=" * 40,
-        f"検知された論文数: {len(alerts)} 件",
-        "",
-    ]
+    buf = io.StringIO()
+    buf.write(PLAIN_HEADER_TEMPLATE % {"count": len(alerts)})
 
     for i, alert in enumerate(alerts, 1):
-        pmid = alert.get("pmid", "N/A")
-        doi = alert.get("doi", "N/A")
-        title = alert.get("title", "N/A")
-        journal = alert.get("journal", "N/A")
-        published_date = alert.get("published_date", "N/A")
-        increase = alert.get("citation_increase", 0)
-        summary = alert.get("summary", "（要約なし）")
-        impact_factor = get_impact_factor(journal)
-
-        lines.extend([
-            f"--- 論文 {i} ---",
-            f"タイトル: {title}",
-            f"ジャーナル: {journal}",
-            f"インパクトファクター: {impact_factor}",
-            f"公開日: {published_date}",
-            f"PMID: {pmid}",
-            f"DOI: {doi if doi else 'N/A'}",
-            f"現在の合計引用数: {increase}",
-            f"",
-            f"日本語要約:",
-            f"{summary}",
-            f"",
-            f"PubMed: https://pubmed.ncbi.nlm.nih.gov/{pmid}/",
-            "",
-        ])
-
-    return "\n".join(lines)
+        buf.write(PLAIN_TEMPLATE % _template_values(i, alert))
+
+    return buf.getvalue()
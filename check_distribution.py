@@ -5,15 +5,18 @@ config.pyの設定に基づいて、直近の引用増加数の分布を集計
 import logging
 import argparse
 from collections import Counter
+from itertools import accumulate
 import signal
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 既存モジュールをインポート
 import config
-from pubmed_fetcher import search_pmids, fetch_article_details
-from opencitations import get_citation_increase
+from pubmed_fetcher import search_pmids, fetch_article_summaries
+from opencitations import get_total_citations_cached
 from dictionary import get_mesh_query
+from database import init_db
 
 # ロギング設定
 logging.basicConfig(
@@ -33,43 +36,57 @@ def signal_handler(sig, frame):
 
 signal.signal(signal.SIGINT, signal_handler)
 
+# 分布グラフのバー（毎回 "█" * n で生成せず、共有文字列をスライスして使う）
+_BAR_WIDTH = 50
+_BAR = "█" * _BAR_WIDTH
+_TINY_BAR = "▏"
+
 def analyze_distribution(limit: int = 200):
     """
     指定件数の論文について引用増加数を調査し、分布を表示する。
     """
+    # 引用数キャッシュテーブルを用意
+    init_db()
+
     # 1. PubMed 検索
     fields = config.DEFAULT_FIELDS
-    logger.info(f"調査対象分野: {fields}")
-    logger.info(f"最大調査件数: {limit}")
+    logger.info("調査対象分野: %s", fields)
+    logger.info("最大調査件数: %d", limit)
 
-    mesh_queries = []
-    for field in fields:
-        q = get_mesh_query(field)
-        if q:
-            mesh_queries.append(q)
+    mesh_queries = list(filter(None, (get_mesh_query(f) for f in fields)))
 
     if not mesh_queries:
         logger.error("有効なクエリがありません")
         return
 
-    all_pmids = []
+    # 重複除去 & 件数制限（出現順を保ったまま limit 件に達した時点で打ち切る）
+    seen = set()
+    target_pmids = []
+    hit_count = 0
     for query in mesh_queries:
         # 検索件数を制限して取得
         pmids = search_pmids(query, retmax=limit*2) # 重複除去等を考慮して多めに
-        all_pmids.extend(pmids)
-    
-    # 重複除去 & 件数制限
-    target_pmids = list(dict.fromkeys(all_pmids))[:limit]
-    logger.info(f"検索ヒット件数: {len(all_pmids)} -> 調査対象: {len(target_pmids)}件")
+        hit_count += len(pmids)
+        for pmid in pmids:
+            if pmid not in seen:
+                seen.add(pmid)
+                target_pmids.append(pmid)
+                if len(target_pmids) >= limit:
+                    break
+        if len(target_pmids) >= limit:
+            break
+
+    logger.info("検索ヒット件数: %d -> 調査対象: %d件", hit_count, len(target_pmids))
 
     if not target_pmids:
         logger.info("対象論文が見つかりませんでした")
         return
 
     # 2. メタデータ取得
+    # DOI・タイトルのみ必要なため、アブストラクトを含まない esummary で取得する
     logger.info("メタデータ取得中...")
-    articles = fetch_article_details(target_pmids)
-    logger.info(f"{len(articles)}件のメタデータを取得しました")
+    articles = fetch_article_summaries(target_pmids)
+    logger.info("%d件のメタデータを取得しました", len(articles))
 
     # 3. 引用増加数集計
     increase_counts = []
@@ -83,42 +100,60 @@ def analyze_distribution(limit: int = 200):
     }
 
     logger.info("OpenCitations APIで引用数調査中... (Ctrl+Cで中断して結果表示)")
-    
+
+    # 同じ DOI を持つ論文が複数あっても API 呼び出しは 1 回にまとめる
+    articles_by_doi: dict[str, list[dict]] = {}
+    for article in articles:
+        doi = article.get("doi")
+        if not doi:
+            stats["no_doi"] += 1
+            logger.debug("DOIなし: %s", article['pmid'])
+            continue
+        articles_by_doi.setdefault(doi, []).append(article)
+
+    # レート制限は opencitations 側のトークンバケットで共有されるため、
+    # ここでは複数リクエストを同時に投げて通信待ちを重ねる
+    executor = ThreadPoolExecutor(max_workers=config.OPENCITATIONS_MAX_WORKERS)
     try:
-        for i, article in enumerate(articles, 1):
+        futures = {
+            executor.submit(get_total_citations_cached, doi): doi
+            for doi in articles_by_doi
+        }
+        n_futures = len(futures)
+
+        for i, future in enumerate(as_completed(futures), 1):
             if interrupted:
                 break
-                
-            doi = article.get("doi")
-            if not doi:
-                stats["no_doi"] += 1
-                logger.debug(f"[{i}/{len(articles)}] DOIなし: {article['pmid']}")
-                continue
-
-            increase = get_citation_increase(doi)
-            
-            if increase is None:
-                stats["api_error"] += 1
-                logger.debug(f"[{i}/{len(articles)}] APIエラー: {doi}")
-                continue
-
-            stats["increases"].append(increase)
-            
-            if increase == 0:
-                stats["zero_increase"] += 1
-                # 0件の場合はログを省略（量が多いので）
-                if i % 10 == 0:
-                     logger.info(f"[{i}/{len(articles)}] PMID:{article['pmid']} Inc:0 (進捗確認用)")
-            else:
-                stats["positive_increase"] += 1
-                logger.info(f"[{i}/{len(articles)}] 📈 増加あり! PMID:{article['pmid']} Inc:+{increase} Title:{article['title'][:30]}...")
-
-            # APIレート制限遵守 (opencitations.py 内でもwaitしてるが念のため)
-            # time.sleep(0.5) 
-            
+
+            doi = futures[future]
+            increase = future.result()
+
+            for article in articles_by_doi[doi]:
+                if increase is None:
+                    stats["api_error"] += 1
+                    logger.debug("[%d/%d] APIエラー: %s", i, n_futures, doi)
+                    continue
+
+                stats["increases"].append(increase)
+
+                if increase == 0:
+                    stats["zero_increase"] += 1
+                    # 0件の場合はログを省略（量が多いので）
+                    if i % 10 == 0:
+                         logger.info("[%d/%d] PMID:%s Inc:0 (進捗確認用)", i, n_futures, article['pmid'])
+                else:
+                    stats["positive_increase"] += 1
+                    logger.info(
+                        "[%d/%d] 📈 増加あり! PMID:%s Inc:+%d Title:%s...",
+                        i, n_futures, article["pmid"], increase, article["title"][:30],
+                    )
+
     except Exception as e:
-        logger.error(f"エラー発生: {e}")
-    
+        logger.error("エラー発生: %s", e)
+    finally:
+        # 中断時は未着手のリクエストを破棄する
+        executor.shutdown(wait=True, cancel_futures=True)
+
     # 4. 集計結果表示
     display_results(stats)
 
@@ -139,28 +174,27 @@ def display_results(stats):
         print("有効な引用データが得られませんでした。")
         return
 
-    # 分布集計
+    # 分布集計（Counter は C 実装の 1 パスで集計する）
+    total = len(increases)
     counter = Counter(increases)
-    sorted_keys = sorted(counter.keys())
-    
-    print("【引用増加数の分布】")
+    sorted_keys = sorted(counter)
+
+    lines = ["【引用増加数の分布】"]
     for k in sorted_keys:
         count = counter[k]
-        bar = "█" * (count * 50 // len(increases)) if len(increases) > 0 else ""
-        if count * 50 // len(increases) == 0 and count > 0:
-            bar = "▏"
-        print(f"  増加数 {k:2d}: {count:3d} 件 ({count/len(increases)*100:5.1f}%) {bar}")
+        bar_len = count * _BAR_WIDTH // total
+        bar = _BAR[:bar_len] if bar_len else _TINY_BAR
+        lines.append(f"  増加数 {k:2d}: {count:3d} 件 ({count/total*100:5.1f}%) {bar}")
 
-    print("-" * 60)
-    print("【閾値別シミュレーション】")
-    cumulative = 0
+    lines.append("-" * 60)
+    lines.append("【閾値別シミュレーション】")
     # 大きい方から累積
-    for k in sorted(sorted_keys, reverse=True):
-        if k <= 0: break
-        cumulative += counter[k]
-        print(f"  閾値 {k} 以上: {cumulative:3d} 件 通知対象")
+    positive_keys = [k for k in reversed(sorted_keys) if k > 0]
+    for k, cumulative in zip(positive_keys, accumulate(counter[k] for k in positive_keys)):
+        lines.append(f"  閾値 {k} 以上: {cumulative:3d} 件 通知対象")
 
-    print("="*60)
+    lines.append("=" * 60)
+    print("\n".join(lines))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="引用増加数分布調査")
@@ -36,13 +36,35 @@ RECIPIENT_EMAIL = os.environ.get('RECIPIENT_EMAIL', '')
 # =========================================================
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
 
+# =========================================================
+# NCBI API キー（任意。設定するとレート上限が 3 → 10 req/s に緩和される）
+# =========================================================
+NCBI_API_KEY = os.environ.get('NCBI_API_KEY', '')
+
+# =========================================================
+# 検索期間（日付未指定時のデフォルト。現在日から何か月前までを対象にするか）
+# main.py の run() と同じく直近 1 年間
+# =========================================================
+PAPER_MAX_MONTHS = 12  # 対象期間の開始（現在日から何か月前）
+PAPER_MIN_MONTHS = 0   # 対象期間の終了（現在日から何か月前）
+
 # =========================================================
 # データベースパス
 # =========================================================
 DB_PATH = os.environ.get('DB_PATH', 'citation_alerts.db')
+# OpenCitations 引用数キャッシュの有効日数。月次実行（毎月 1 日）の間隔（28〜31 日）より
+# 十分短くし、前回実行時の引用数を次の実行で使い回さないようにする
+CITATION_CACHE_TTL_DAYS = 14
+# 閾値付近（閾値 - マージン 以上）の引用数は閾値を超えうるため、短い有効日数で再取得する
+CITATION_NEAR_THRESHOLD_MARGIN = 3
+CITATION_NEAR_THRESHOLD_TTL_DAYS = 7
+FETCHED_ARTICLE_TTL_DAYS = 30  # efetch 済み論文データ（アブストラクト）の保存有効日数
 
 # =========================================================
 # API リクエスト設定
 # =========================================================
-PUBMED_WAIT_SEC = 0.35       # PubMed API リクエスト間ウェイト（秒）
+# PubMed API リクエスト間ウェイト（秒）。API キーありなら 10 req/s、なしなら 3 req/s
+PUBMED_WAIT_SEC = 0.105 if NCBI_API_KEY else 0.35
+PUBMED_MAX_WORKERS = 10 if NCBI_API_KEY else 3  # efetch / esummary の同時リクエスト数
 OPENCITATIONS_WAIT_SEC = 1.0  # OpenCitations API リクエスト間ウェイト（秒）
+OPENCITATIONS_MAX_WORKERS = 8  # OpenCitations API の同時リクエスト数
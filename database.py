@@ -1,10 +1,12 @@
 """
 PubMed 引用数検索システム — データベース操作
-SQLite でアラートイベントを記録・管理する。
+SQLite でアラートイベントと引用数キャッシュを記録・管理する。
 """
 
+import atexit
 import sqlite3
 import logging
+import threading
 
 import config
 
@@ -27,23 +29,120 @@ CREATE TABLE IF NOT EXISTS alerts (
 );
 """
 
+# 同一 PMID + detected_month の重複を DB 側で弾くためのユニークインデックス
+CREATE_ALERTS_UNIQUE_INDEX_SQL = """
+CREATE UNIQUE INDEX IF NOT EXISTS ux_alerts_pmid_month ON alerts(pmid, detected_month);
+"""
+
+INSERT_ALERT_SQL = """
+INSERT OR IGNORE INTO alerts
+    (pmid, doi, title, journal, published_date, citation_increase, detected_month, notified)
+VALUES
+    (:pmid, :doi, :title, :journal, :published_date, :citation_increase, :detected_month, 0)
+"""
+
+CREATE_CITATION_CACHE_SQL = """
+CREATE TABLE IF NOT EXISTS citation_cache (
+    doi              TEXT    PRIMARY KEY,
+    total            INTEGER NOT NULL,
+    fetched_at       TEXT    NOT NULL
+);
+"""
+
+CREATE_FETCHED_ARTICLES_SQL = """
+CREATE TABLE IF NOT EXISTS fetched_articles (
+    pmid             TEXT    PRIMARY KEY,
+    doi              TEXT,
+    title            TEXT,
+    journal          TEXT,
+    published_date   TEXT,
+    abstract         TEXT,
+    fetched_at       TEXT    NOT NULL
+);
+"""
+
+INSERT_FETCHED_ARTICLE_SQL = """
+INSERT OR REPLACE INTO fetched_articles
+    (pmid, doi, title, journal, published_date, abstract, fetched_at)
+VALUES
+    (:pmid, :doi, :title, :journal, :published_date, :abstract, datetime('now'))
+"""
+
+# IN 句に渡すパラメータ数の上限（SQLite の既定上限 999 を下回るように分割する）
+SQLITE_MAX_PARAMS = 500
+
+
+# スレッドごとに 1 本の接続を使い回す
+_tls = threading.local()
+_connections: list[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+
 
 def _get_connection() -> sqlite3.Connection:
-    """DB 接続を返す（row_factory 設定済み）。"""
-    conn = sqlite3.connect(config.DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """
+    DB 接続を返す（row_factory・WAL モード設定済み）。
+    接続はスレッドごとに初回のみ生成し、以降は同じ接続を再利用する。
+    """
+    conn = getattr(_tls, "conn", None)
+    if conn is None:
+        # atexit で別スレッドから close できるよう check_same_thread=False
+        conn = sqlite3.connect(config.DB_PATH, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # 並列実行時も読み込みと書き込みが互いをブロックしないよう WAL を使う
+        conn.executescript(
+            "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY;"
+        )
+        _tls.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
     return conn
 
 
+def _close_all() -> None:
+    """全スレッドの DB 接続を閉じる（プロセス終了時に呼ばれる）。"""
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+
+
+atexit.register(_close_all)
+
+
 def init_db() -> None:
     """データベースとテーブルを初期化する。"""
     conn = _get_connection()
-    try:
-        conn.execute(CREATE_TABLE_SQL)
-        conn.commit()
-        logger.info(f"データベースを初期化しました: {config.DB_PATH}")
-    finally:
-        conn.close()
+    conn.execute(CREATE_TABLE_SQL)
+    conn.execute(CREATE_ALERTS_UNIQUE_INDEX_SQL)
+    conn.execute(CREATE_CITATION_CACHE_SQL)
+    conn.execute(CREATE_FETCHED_ARTICLES_SQL)
+    conn.commit()
+    logger.info("データベースを初期化しました: %s", config.DB_PATH)
+
+
+def insert_alerts(rows: list[dict]) -> int:
+    """
+    複数のアラートレコードを 1 トランザクションでまとめて挿入する。
+    同じ PMID + detected_month の重複は挿入しない。
+
+    Args:
+        rows: アラートレコードの辞書リスト。各辞書は以下のキーを持つ:
+            - pmid, doi, title, journal, published_date,
+              citation_increase, detected_month
+
+    Returns:
+        実際に挿入した件数
+    """
+    if not rows:
+        return 0
+
+    conn = _get_connection()
+    before = conn.total_changes
+    with conn:
+        conn.executemany(INSERT_ALERT_SQL, rows)
+    inserted = conn.total_changes - before
+    logger.info("アラート記録: %d 件（重複スキップ: %d 件）", inserted, len(rows) - inserted)
+    return inserted
 
 
 def insert_alert(
@@ -61,31 +160,33 @@ def insert_alert(
     Returns:
         True: 挿入成功、 False: 重複のためスキップ
     """
+    return insert_alerts([{
+        "pmid": pmid,
+        "doi": doi,
+        "title": title,
+        "journal": journal,
+        "published_date": published_date,
+        "citation_increase": citation_increase,
+        "detected_month": detected_month,
+    }]) == 1
+
+
+def existing_pmids_for_month(detected_month: str) -> set[str]:
+    """
+    指定月に記録済みの PMID 集合を返す（重複チェックを 1 クエリで済ませるため）。
+
+    Args:
+        detected_month: 検知年月（例: '2025-01'）
+
+    Returns:
+        PMID の集合
+    """
     conn = _get_connection()
-    try:
-        # 重複チェック
-        existing = conn.execute(
-            "SELECT id FROM alerts WHERE pmid = ? AND detected_month = ?",
-            (pmid, detected_month),
-        ).fetchone()
-
-        if existing:
-            logger.debug(f"重複レコードをスキップ: PMID={pmid}, month={detected_month}")
-            return False
-
-        conn.execute(
-            """
-            INSERT INTO alerts
-                (pmid, doi, title, journal, published_date, citation_increase, detected_month, notified)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 0)
-            """,
-            (pmid, doi, title, journal, published_date, citation_increase, detected_month),
-        )
-        conn.commit()
-        logger.info(f"アラート記録: PMID={pmid}, 増加数={citation_increase}")
-        return True
-    finally:
-        conn.close()
+    rows = conn.execute(
+        "SELECT pmid FROM alerts WHERE detected_month = ?",
+        (detected_month,),
+    ).fetchall()
+    return {row[0] for row in rows}
 
 
 def get_pending_alerts(detected_month: str) -> list[dict]:
@@ -99,20 +200,17 @@ def get_pending_alerts(detected_month: str) -> list[dict]:
         アラートレコードの辞書リスト
     """
     conn = _get_connection()
-    try:
-        rows = conn.execute(
-            """
-            SELECT id, pmid, doi, title, journal, published_date,
-                   citation_increase, detected_month, notified
-            FROM alerts
-            WHERE detected_month = ? AND notified = 0
-            ORDER BY citation_increase DESC
-            """,
-            (detected_month,),
-        ).fetchall()
-        return [dict(row) for row in rows]
-    finally:
-        conn.close()
+    rows = conn.execute(
+        """
+        SELECT id, pmid, doi, title, journal, published_date,
+               citation_increase, detected_month, notified
+        FROM alerts
+        WHERE detected_month = ? AND notified = 0
+        ORDER BY citation_increase DESC
+        """,
+        (detected_month,),
+    ).fetchall()
+    return [dict(row) for row in rows]
 
 
 def mark_as_notified(alert_ids: list[int]) -> None:
@@ -123,13 +221,90 @@ def mark_as_notified(alert_ids: list[int]) -> None:
         return
 
     conn = _get_connection()
-    try:
-        placeholders = ','.join('?' for _ in alert_ids)
-        conn.execute(
-            f"UPDATE alerts SET notified = 1 WHERE id IN ({placeholders})",
-            alert_ids,
-        )
-        conn.commit()
-        logger.info(f"通知済みに更新: {len(alert_ids)} 件")
-    finally:
-        conn.close()
+    placeholders = ','.join('?' for _ in alert_ids)
+    conn.execute(
+        f"UPDATE alerts SET notified = 1 WHERE id IN ({placeholders})",
+        alert_ids,
+    )
+    conn.commit()
+    logger.info("通知済みに更新: %d 件", len(alert_ids))
+
+
+def cache_get(doi: str, ttl_days: int = config.CITATION_CACHE_TTL_DAYS) -> int | None:
+    """
+    キャッシュ済みの合計引用数を取得する。
+
+    Args:
+        doi: 論文の DOI
+        ttl_days: キャッシュの有効日数
+
+    Returns:
+        合計引用数。キャッシュが存在しないか期限切れの場合は None。
+    """
+    conn = _get_connection()
+    row = conn.execute(
+        """
+        SELECT total FROM citation_cache
+        WHERE doi = ? AND fetched_at >= datetime('now', ?)
+        """,
+        (doi, f"-{ttl_days} days"),
+    ).fetchone()
+    return row["total"] if row else None
+
+
+def cache_put(doi: str, total: int) -> None:
+    """合計引用数をキャッシュに保存する（既存レコードは上書き）。"""
+    conn = _get_connection()
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO citation_cache (doi, total, fetched_at)
+        VALUES (?, ?, datetime('now'))
+        """,
+        (doi, total),
+    )
+    conn.commit()
+
+
+def get_fetched_articles(
+    pmids: list[str], ttl_days: int = config.FETCHED_ARTICLE_TTL_DAYS,
+) -> dict[str, dict]:
+    """
+    efetch 済みとして保存されている論文データ（有効期限内のみ）を取得する。
+
+    Args:
+        pmids: PMID のリスト
+        ttl_days: 保存データの有効日数
+
+    Returns:
+        PMID → 論文情報の辞書（pmid, doi, title, journal, published_date, abstract）
+    """
+    conn = _get_connection()
+    found: dict[str, dict] = {}
+    for i in range(0, len(pmids), SQLITE_MAX_PARAMS):
+        chunk = pmids[i : i + SQLITE_MAX_PARAMS]
+        placeholders = ','.join('?' for _ in chunk)
+        rows = conn.execute(
+            f"""
+            SELECT pmid, doi, title, journal, published_date, abstract
+            FROM fetched_articles
+            WHERE pmid IN ({placeholders}) AND fetched_at >= datetime('now', ?)
+            """,
+            [*chunk, f"-{ttl_days} days"],
+        ).fetchall()
+        for row in rows:
+            found[row["pmid"]] = dict(row)
+    return found
+
+
+def put_fetched_articles(articles: list[dict]) -> None:
+    """
+    efetch で取得した論文データを 1 トランザクションで保存する（既存レコードは上書き）。
+    アブストラクトのない論文は後から登録されうるため保存せず、次回も efetch で取り直す。
+    """
+    articles = [article for article in articles if article.get("abstract")]
+    if not articles:
+        return
+
+    conn = _get_connection()
+    with conn:
+        conn.executemany(INSERT_FETCHED_ARTICLE_SQL, articles)
@@ -4,6 +4,10 @@ PubMed 引用数検索システム — 辞書ファイル
 """
 
 import logging
+from functools import lru_cache
+
+from rapidfuzz import utils
+from rapidfuzz.distance import OSA
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +55,39 @@ IMPACT_FACTOR_DICTIONARY: dict[str, float] = {
 }
 
 
+# 大文字小文字を無視した検索用に、キーを小文字化した辞書を読み込み時に一度だけ作る
+_IF_LOWER_DICT: dict[str, float] = {k.lower(): v for k, v in IMPACT_FACTOR_DICTIONARY.items()}
+# 部分一致は長いキーから試し、'Ophthalmology' より具体的な誌名を優先する
+_IF_LOWER_ITEMS: tuple[tuple[str, float], ...] = tuple(
+    sorted(_IF_LOWER_DICT.items(), key=lambda item: len(item[0]), reverse=True)
+)
+
+# 部分一致でキーの後ろに続いてよい文字（'Retina (Philadelphia, Pa.)' や
+# "Graefe's archive ... = Albrecht von Graefes Archiv ..." のような付記の区切り）
+_SUFFIX_SEPARATORS = "(=:.,"
+
+# アポストロフィは語の区切りにせず取り除く（"Graefe's" と 'Graefes' を同じ語にする）
+_APOSTROPHES = str.maketrans("", "", "'\u2019")
+
+# あいまい一致は綴り誤り程度の差だけを拾う。全体の類似度（ratio）で判定すると
+# 'African Journal of Ophthalmology' → 'American Journal of Ophthalmology' のように
+# 1 語だけ異なる別誌に一致してしまうため、語数が同じで、各語の差が
+# 1 文字の脱落・挿入・置換・隣接入れ替えまでの場合に限る
+JOURNAL_MATCH_MAX_TYPOS = 2  # 名称全体で許容する綴り誤りの数
+
+def _journal_tokens(name: str) -> tuple[str, ...]:
+    """ジャーナル名を大文字小文字・記号を無視した語のタプルに正規化する。"""
+    return tuple(utils.default_process(name.translate(_APOSTROPHES)).split())
+
+
+# あいまい一致の候補: 語数 → {元のキー: 正規化済みの語のタプル}
+_IF_TOKENS_BY_LEN: dict[int, dict[str, tuple[str, ...]]] = {}
+for _key in IMPACT_FACTOR_DICTIONARY:
+    _tokens = _journal_tokens(_key)
+    _IF_TOKENS_BY_LEN.setdefault(len(_tokens), {})[_key] = _tokens
+del _key, _tokens
+
+
 def get_mesh_query(keyword: str) -> str | None:
     """
     日本語キーワードを PubMed MeSH クエリに変換する。
@@ -63,14 +100,16 @@ def get_mesh_query(keyword: str) -> str | None:
     """
     query = MESH_DICTIONARY.get(keyword)
     if query is None:
-        logger.error(f"辞書に存在しないキーワード: '{keyword}' — スキップします")
+        logger.error("辞書に存在しないキーワード: '%s' — スキップします", keyword)
     return query
 
 
+@lru_cache(maxsize=2048)
 def get_impact_factor(journal_name: str) -> str | float:
     """
     ジャーナル名からインパクトファクターを取得する。
-    完全一致を試み、失敗した場合は部分一致で検索する。
+    完全一致 → 大文字小文字を無視した完全一致 → あいまい一致（綴り誤り）
+    → 部分一致の順に検索する。
 
     Args:
         journal_name: ジャーナル名
@@ -82,13 +121,51 @@ def get_impact_factor(journal_name: str) -> str | float:
         return 'N/A'
 
     # 完全一致
-    if journal_name in IMPACT_FACTOR_DICTIONARY:
-        return IMPACT_FACTOR_DICTIONARY[journal_name]
+    value = IMPACT_FACTOR_DICTIONARY.get(journal_name)
+    if value is not None:
+        return value
 
-    # 部分一致（大文字小文字無視）
+    # 完全一致（大文字小文字無視）
     journal_lower = journal_name.lower()
-    for key, value in IMPACT_FACTOR_DICTIONARY.items():
-        if key.lower() in journal_lower or journal_lower in key.lower():
+    value = _IF_LOWER_DICT.get(journal_lower)
+    if value is not None:
+        return value
+
+    # あいまい一致（大文字小文字・記号を無視し、語数が同じ名称の綴り誤りのみ）
+    match = _match_typo(_journal_tokens(journal_name))
+    if match:
+        return IMPACT_FACTOR_DICTIONARY[match]
+
+    # 部分一致（大文字小文字無視）。'Retina (Philadelphia, Pa.)' のような付記つきの名称向け。
+    # 'BMC Ophthalmology' が 'Ophthalmology' に一致しないよう、キーは名称の先頭にあり
+    # 付記の区切りが続く場合に限る
+    for key_lower, value in _IF_LOWER_ITEMS:
+        if journal_lower.startswith(key_lower):
+            rest = journal_lower[len(key_lower):].lstrip()
+            if not rest or rest[0] in _SUFFIX_SEPARATORS:
+                return value
+        elif journal_lower in key_lower:
             return value
 
     return 'N/A'
+
+
+def _match_typo(tokens: tuple[str, ...]) -> str | None:
+    """
+    正規化済みの語のタプルと綴り誤りの範囲で一致する IF 辞書のキーを返す。
+    複数該当する場合は誤りの少ないものを優先する。
+    """
+    best_key, best_typos = None, JOURNAL_MATCH_MAX_TYPOS + 1
+    for key, key_tokens in _IF_TOKENS_BY_LEN.get(len(tokens), {}).items():
+        typos = 0
+        for token, key_token in zip(tokens, key_tokens):
+            if token == key_token:
+                continue
+            # 1 語あたり 1 文字までの差、かつ短い語（'eye' など）は別語とみなす
+            if len(key_token) < 4 or OSA.distance(token, key_token, score_cutoff=1) > 1:
+                break
+            typos += 1
+        else:
+            if typos < best_typos:
+                best_key, best_typos = key, typos
+    return best_key
@@ -5,11 +5,17 @@ Gemini API でアブストラクトを日本語要約する。
 """
 
 import logging
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+import orjson
 from google import genai
+from google.genai import types
 
 import config
+from rate_limiter import TokenBucket
 
 logger = logging.getLogger(__name__)
 
@@ -19,18 +25,65 @@ SUMMARIZE_PROMPT = (
     "専門用語はそのまま使用し、簡潔にまとめてください。\n\n"
 )
 
+# 複数アブストラクトを 1 リクエストで要約するためのプロンプト
+SUMMARIZE_BATCH_PROMPT = (
+    "以下の医学論文アブストラクト %d 件を、それぞれ3〜5文で日本語要約してください。"
+    "専門用語はそのまま使用し、簡潔にまとめてください。\n"
+    "出力は要約文字列の JSON 配列とし、入力と同じ順序で並べてください。\n\n"
+)
+
+# API 呼び出しがすべて失敗した場合の要約欄の文言
+SUMMARY_FAILED_MESSAGE = "（Gemini API による要約に失敗しました）"
+
 # リトライ設定
 MAX_RETRIES = 3
 RETRY_WAIT_SEC = 65      # 429 エラー時の待機秒数（API の指示に合わせて長め）
-INTER_REQUEST_WAIT_SEC = 5  # 通常リクエスト間のウェイト（無料枠 15RPM → 最低4秒）
+REQUESTS_PER_MINUTE = 15   # 無料枠のレート上限（15RPM）
+MAX_WORKERS = 4            # summarize_many の同時実行数
+BATCH_SIZE = 5             # summarize_many で 1 リクエストにまとめるアブストラクト数
+
+# エラーメッセージ中の "retry in XXs" を抽出するパターン
+_RETRY_RE = re.compile(r"retry in (\d+\.?\d*)s", re.IGNORECASE)
 
 # モデル名
 MODEL_NAME = "gemini-2.0-flash"
 
+# バッチ要約では応答を文字列の JSON 配列に固定し、見出し形式の揺れに左右されないようにする
+_BATCH_CONFIG = types.GenerateContentConfig(
+    response_mime_type="application/json",
+    response_schema=list[str],
+)
+
+# 全ワーカーで共有するレートリミッタ（上限に達したときだけ待機する）
+_BUCKET = TokenBucket(rate=REQUESTS_PER_MINUTE / 60)
+
+
+# 認証エラーとみなす HTTP ステータスコード
+AUTH_ERROR_CODES = (401, 403)
+
+
+# プロセス内で共有するクライアント（summarize_many の全ワーカーが同じ HTTP 接続プールを使う）
+_CLIENT: genai.Client | None = None
+_CLIENT_LOCK = threading.Lock()
+
 
 def _get_client() -> genai.Client:
-    """Gemini クライアントを初期化して返す。"""
-    return genai.Client(api_key=config.GEMINI_API_KEY)
+    """
+    Gemini クライアントを返す。
+    HTTP 接続プールを使い回すため、プロセス内で一度だけ生成してキャッシュする。
+    """
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = genai.Client(api_key=config.GEMINI_API_KEY)
+        return _CLIENT
+
+
+def _reset_client() -> None:
+    """キャッシュ済みクライアントを破棄する（認証情報の更新時など）。"""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        _CLIENT = None
 
 
 def summarize_abstract(abstract: str) -> str:
@@ -50,33 +103,135 @@ def summarize_abstract(abstract: str) -> str:
         logger.error("GEMINI_API_KEY が設定されていません")
         return "（Gemini API キーが未設定のため要約をスキップしました）"
 
+    summary = _generate(SUMMARIZE_PROMPT + abstract)
+    if summary is None:
+        return SUMMARY_FAILED_MESSAGE
+    return summary
+
+
+def _generate(prompt: str,
+              generation_config: types.GenerateContentConfig | None = None) -> str | None:
+    """
+    Gemini API にプロンプトを送り、応答テキストを返す。
+    エラー時はリトライし、すべて失敗した場合は None を返す。
+    """
     client = _get_client()
-    prompt = SUMMARIZE_PROMPT + abstract
 
     for attempt in range(1, MAX_RETRIES + 1):
+        # リクエスト間のウェイト（レートリミット対策）
+        _BUCKET.acquire()
         try:
             response = client.models.generate_content(
                 model=MODEL_NAME,
                 contents=prompt,
+                config=generation_config,
             )
-            summary = response.text.strip()
-            logger.info(f"Gemini 要約完了 ({len(summary)} 文字)")
-            # リクエスト間のウェイト（レートリミット対策）
-            time.sleep(INTER_REQUEST_WAIT_SEC)
-            return summary
+            text = response.text.strip()
+            logger.info("Gemini 要約完了 (%d 文字)", len(text))
+            return text
         except Exception as e:
             err_str = str(e)
             logger.warning(
-                f"Gemini API エラー (試行 {attempt}/{MAX_RETRIES}): {e}"
+                "Gemini API エラー (試行 %d/%d): %s", attempt, MAX_RETRIES, e
             )
+            if getattr(e, "code", None) in AUTH_ERROR_CODES:
+                # 認証エラー時はクライアントを作り直して最新の認証情報を使う
+                _reset_client()
+                client = _get_client()
             if attempt < MAX_RETRIES:
                 # エラーメッセージから retry 秒数を抽出して待機
+                # （待機するのはこのワーカーのみ。他のワーカーは処理を継続する）
                 wait_sec = RETRY_WAIT_SEC
-                import re
-                m = re.search(r"retry in (\d+\.?\d*)s", err_str, re.IGNORECASE)
+                m = _RETRY_RE.search(err_str)
                 if m:
                     wait_sec = float(m.group(1)) + 5  # 少し余裕を持たせる
-                logger.info(f"  {wait_sec:.0f} 秒後にリトライします...")
+                logger.info("  %.0f 秒後にリトライします...", wait_sec)
                 time.sleep(wait_sec)
 
-    return "（Gemini API による要約に失敗しました）"
+    return None
+
+
+def _summarize_batch(abstracts: list[str]) -> list[str]:
+    """
+    複数のアブストラクトを 1 リクエストで要約する（応答は文字列の JSON 配列）。
+    応答から要約を取り出せなかった分は個別リクエストで要約し直す
+    （API 呼び出し自体が失敗した場合は再送せず、全件を失敗扱いにする）。
+    """
+    if len(abstracts) == 1:
+        return [summarize_abstract(abstracts[0])]
+
+    body = "\n\n".join(f"### {i}\n{abstract}" for i, abstract in enumerate(abstracts, 1))
+    text = _generate(SUMMARIZE_BATCH_PROMPT % len(abstracts) + body, _BATCH_CONFIG)
+    if text is None:
+        # API 自体が失敗している（クォータ超過など）ため、個別リクエストで負荷を増やさない
+        return [SUMMARY_FAILED_MESSAGE] * len(abstracts)
+
+    parsed = _parse_batch_response(text, len(abstracts))
+    if parsed is None:
+        logger.warning("Gemini バッチ要約に失敗したため %d 件を個別に要約します", len(abstracts))
+        return [summarize_abstract(abstract) for abstract in abstracts]
+
+    summaries = []
+    for i, (abstract, summary) in enumerate(zip(abstracts, parsed), 1):
+        if not summary:
+            logger.warning("Gemini バッチ要約の応答に %d 番目の要約がないため個別に要約します", i)
+            summary = summarize_abstract(abstract)
+        summaries.append(summary)
+    return summaries
+
+
+def _parse_batch_response(text: str, expected: int) -> list[str] | None:
+    """
+    バッチ要約の応答（文字列の JSON 配列）を要約のリストに変換する。
+    形式や件数が合わない場合は、どの要約がどの入力に対応するか判断できないため None を返す。
+    """
+    if not text:
+        return None
+    try:
+        data = orjson.loads(text)
+    except orjson.JSONDecodeError as e:
+        logger.warning("Gemini バッチ要約の応答が JSON ではありません: %s", e)
+        return None
+    if not isinstance(data, list) or len(data) != expected:
+        logger.warning(
+            "Gemini バッチ要約の応答件数が一致しません (期待 %d 件, 応答 %s)",
+            expected, len(data) if isinstance(data, list) else type(data).__name__,
+        )
+        return None
+    return [item.strip() if isinstance(item, str) else "" for item in data]
+
+
+def summarize_many(abstracts: list[str | None]) -> list[str]:
+    """
+    複数のアブストラクトを日本語要約する。
+    BATCH_SIZE 件ずつ 1 リクエストにまとめ、各リクエストを並列に送る。
+    レート制限は全ワーカーで共有するため、全体で REQUESTS_PER_MINUTE を超えない。
+
+    Args:
+        abstracts: 英語アブストラクトのリスト（None・空文字を含んでもよい）
+
+    Returns:
+        入力と同じ順序の日本語要約リスト
+    """
+    if not abstracts:
+        return []
+
+    results: list[str | None] = [None] * len(abstracts)
+    pending = []
+    for i, abstract in enumerate(abstracts):
+        if config.GEMINI_API_KEY and abstract and abstract.strip():
+            pending.append(i)
+        else:
+            # アブストラクトなし・API キー未設定の場合は API を呼ばずに定型文を返す
+            results[i] = summarize_abstract(abstract)
+    chunks = [pending[i : i + BATCH_SIZE] for i in range(0, len(pending), BATCH_SIZE)]
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        batch_results = executor.map(
+            _summarize_batch, [[abstracts[i] for i in chunk] for chunk in chunks]
+        )
+        for chunk, summaries in zip(chunks, batch_results):
+            for i, summary in zip(chunk, summaries):
+                results[i] = summary
+
+    return results
@@ -5,11 +5,11 @@ PubMed 引用数検索システム — エントリーポイント
   1. config.py から設定読み込み
   2. 日本語キーワードを MeSH クエリに変換
   3. PubMed API で指定期間の PMID 一覧を取得
-  4. PMID からメタデータ（DOI・ジャーナル名・アブストラクト）を取得
+  4. PMID からメタデータ（DOI・ジャーナル名）を esummary で取得
   5. OpenCitations COCI で合計引用数を取得し閾値（10回以上）でフィルタ
   6. 条件合致論文を SQLite DB に記録
   7. 未通知レコードを取得
-  8. Gemini API でアブストラクトを日本語要約
+  8. 閾値超過論文のアブストラクトを efetch で取得し、Gemini API で日本語要約
   9. ジャーナル IF を辞書から取得
   10. メール本文を生成して Gmail 送信
   11. 送信済み論文の notified を更新
@@ -24,9 +24,14 @@ from dateutil.relativedelta import relativedelta
 import config
 import opencitations
 from dictionary import get_mesh_query
-from pubmed_fetcher import search_pmids, fetch_article_details
-from gemini_summarizer import summarize_abstract
-from database import init_db, insert_alert, get_pending_alerts, mark_as_notified
+from pubmed_fetcher import (
+    ESEARCH_RETMAX, search_pmids, fetch_article_summaries, fetch_article_details,
+)
+from gemini_summarizer import summarize_many
+from database import (
+    init_db, insert_alerts, existing_pmids_for_month, get_pending_alerts, mark_as_notified,
+    get_fetched_articles, put_fetched_articles,
+)
 from alert import send_alert_email
 
 # =========================================================
@@ -42,7 +47,8 @@ logger = logging.getLogger(__name__)
 
 
 def run(start_date: str = None, end_date: str = None,
-        article_types: list[str] = None, dry_run: bool = False) -> None:
+        article_types: list[str] = None, dry_run: bool = False,
+        per_field_search: bool = False) -> None:
     """
     メイン実行フロー。
 
@@ -51,6 +57,8 @@ def run(start_date: str = None, end_date: str = None,
         end_date: 検索終了日 (YYYY/MM/DD)
         article_types: 対象 Article Type リスト。None の場合は config から取得。
         dry_run: True の場合、メール送信をスキップ
+        per_field_search: True の場合、分野ごとに個別に PubMed 検索する
+            （False の場合は全分野を OR で結合した 1 回の検索）
     """
     logger.info("=" * 60)
     logger.info("PubMed 引用数検索システム — 実行開始")
@@ -96,17 +104,29 @@ def run(start_date: str = None, end_date: str = None,
 
     # ステップ 3: PubMed 検索
     logger.info("ステップ 3: PubMed API で PMID 一覧を取得")
-    all_pmids = []
-    for query in mesh_queries:
-        pmids = search_pmids(
-            query,
+    if per_field_search:
+        # 分野ごとに検索（分野別の件数をログで確認したい場合）
+        all_pmids = []
+        for query in mesh_queries:
+            pmids = search_pmids(
+                query,
+                mindate=start_date,
+                maxdate=end_date,
+                article_types=article_types,
+            )
+            all_pmids.extend(pmids)
+    else:
+        # 全分野を OR で結合し、1 回の esearch で取得する（重複はサーバー側で除去される）
+        combined_query = " OR ".join(f"({q})" for q in mesh_queries)
+        all_pmids = search_pmids(
+            combined_query,
             mindate=start_date,
             maxdate=end_date,
             article_types=article_types,
+            retmax=ESEARCH_RETMAX * len(mesh_queries),
         )
-        all_pmids.extend(pmids)
 
-    # 重複除去
+    # 重複除去（分野別検索の場合のみ重複がありうる）
     all_pmids = list(dict.fromkeys(all_pmids))
     logger.info(f"  合計 PMID 数: {len(all_pmids)}")
 
@@ -115,8 +135,9 @@ def run(start_date: str = None, end_date: str = None,
         return
 
     # ステップ 4: メタデータ取得
-    logger.info("ステップ 4: PubMed efetch でメタデータ取得")
-    articles = fetch_article_details(all_pmids)
+    # アブストラクトは閾値超過論文にしか使わないため、ここでは軽量な esummary を使う
+    logger.info("ステップ 4: PubMed esummary でメタデータ取得")
+    articles = fetch_article_summaries(all_pmids)
     logger.info(f"  取得した論文数: {len(articles)}")
 
     # ステップ 5-6: 引用数確認 + DB記録
@@ -125,34 +146,47 @@ def run(start_date: str = None, end_date: str = None,
     detected_period = f"{start_date or 'base'} to {end_date or 'base'}"
     hit_count = 0
 
-    total = len(articles)
-    for idx, article in enumerate(articles, 1):
-        doi = article.get("doi")
-        if not doi:
-            continue
-
-        if idx % 50 == 0:
-            logger.info(f"  進捗: {idx}/{total} 件処理済み...")
+    # 記録済みの PMID は引用数の再確認も DB への再挿入も不要
+    existing = existing_pmids_for_month(detected_period)
+    if existing:
+        logger.info(f"  記録済み PMID: {len(existing)} 件（スキップ）")
+    rows = []
+
+    # 引用数の取得は I/O 待ちが大半のため並列に行い、判定は元の順序で行う
+    candidates = [
+        article for article in articles
+        if article.get("doi") and article["pmid"] not in existing
+    ]
+    citations = opencitations.get_total_citations_many(
+        [a["doi"] for a in candidates], threshold=threshold,
+    )
 
-        total_citations = opencitations.get_total_citations(doi)
+    # ログ出力の要否はループの外で一度だけ判定する
+    log_hits = logger.isEnabledFor(logging.INFO)
+    for article in candidates:
+        doi = article["doi"]
+        total_citations = citations.get(doi)
         if total_citations is None:
             continue
 
         if total_citations >= threshold:
             hit_count += 1
-            logger.info(
-                f"  ✅ 条件合致: PMID={article['pmid']}, "
-                f"合計引用数={total_citations}, タイトル={article['title'][:60]}..."
-            )
-            insert_alert(
-                pmid=article["pmid"],
-                doi=doi,
-                title=article["title"],
-                journal=article["journal"],
-                published_date=article["published_date"],
-                citation_increase=total_citations, # カラム名はそのまま流用（実体は合計数）
-                detected_month=detected_period,
-            )
+            if log_hits:
+                logger.info(
+                    "  ✅ 条件合致: PMID=%s, 合計引用数=%d, タイトル=%s...",
+                    article["pmid"], total_citations, article["title"][:60],
+                )
+            rows.append({
+                "pmid": article["pmid"],
+                "doi": doi,
+                "title": article["title"],
+                "journal": article["journal"],
+                "published_date": article["published_date"],
+                "citation_increase": total_citations, # カラム名はそのまま流用（実体は合計数）
+                "detected_month": detected_period,
+            })
+
+    insert_alerts(rows)
 
     logger.info(f"  閾値超過 (>= {threshold}): {hit_count}")
 
@@ -166,23 +200,26 @@ def run(start_date: str = None, end_date: str = None,
         return
 
     # ステップ 8: Gemini 要約
-    logger.info("ステップ 8: Gemini API でアブストラクト日本語要約")
-    for alert_record in pending:
-        pmid = alert_record["pmid"]
-        # アブストラクトを取得（articlesから検索）
-        abstract = None
-        for article in articles:
-            if article["pmid"] == pmid:
-                abstract = article.get("abstract")
-                break
-
-        if abstract:
-            summary = summarize_abstract(abstract)
-        else:
-            summary = "（アブストラクトが存在しないため要約できません）"
-
+    logger.info("ステップ 8: PubMed efetch でアブストラクト取得 + Gemini API で日本語要約")
+    # 有効期限内に efetch 済みのアブストラクトは DB から読み、残りだけを efetch する
+    pending_pmids = [a["pmid"] for a in pending]
+    abstracts_by_pmid = {
+        pmid: article["abstract"] for pmid, article in get_fetched_articles(pending_pmids).items()
+    }
+    missing_pmids = [pmid for pmid in pending_pmids if pmid not in abstracts_by_pmid]
+    if abstracts_by_pmid:
+        logger.info("  取得済みアブストラクト: %d 件（efetch をスキップ）", len(abstracts_by_pmid))
+    if missing_pmids:
+        fetched = fetch_article_details(missing_pmids)
+        put_fetched_articles(fetched)
+        abstracts_by_pmid.update((a["pmid"], a["abstract"]) for a in fetched)
+    abstracts = [abstracts_by_pmid.get(a["pmid"]) for a in pending]
+
+    # アブストラクトがない場合は summarize_abstract 側で定型文を返す
+    summaries = summarize_many(abstracts)
+    for alert_record, summary in zip(pending, summaries):
         alert_record["summary"] = summary
-        logger.info(f"  PMID={pmid}: 要約完了")
+        logger.info("  PMID=%s: 要約完了", alert_record["pmid"])
 
     # ステップ 9: IF はメール生成時に dictionary.py から自動取得
 
@@ -192,15 +229,9 @@ def run(start_date: str = None, end_date: str = None,
         logger.info("  [ドライラン] メール送信をスキップ")
         logger.info("  === メール内容プレビュー ===")
         for alert_record in pending:
-            logger.info(
-                f"  タイトル: {alert_record.get('title', 'N/A')}"
-            )
-            logger.info(
-                f"  合計引用数: {alert_record.get('citation_increase', 0)}"
-            )
-            logger.info(
-                f"  要約: {alert_record.get('summary', 'N/A')[:100]}..."
-            )
+            logger.info("  タイトル: %s", alert_record.get("title", "N/A"))
+            logger.info("  合計引用数: %s", alert_record.get("citation_increase", 0))
+            logger.info("  要約: %s...", alert_record.get("summary", "N/A")[:100])
             logger.info("  ---")
     else:
         success = send_alert_email(pending)
@@ -248,6 +279,11 @@ def main():
             "フィルタなしにする場合は --article-types（値なし）を指定。"
         ),
     )
+    parser.add_argument(
+        "--per-field-search",
+        action="store_true",
+        help="分野ごとに個別に PubMed 検索する（デフォルトは全分野を OR で結合して 1 回で検索）",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -264,7 +300,8 @@ def main():
             start_date=args.start_date,
             end_date=args.end_date,
             article_types=article_types,
-            dry_run=args.dry_run
+            dry_run=args.dry_run,
+            per_field_search=args.per_field_search,
         )
     except Exception as e:
         logger.exception(f"予期せぬエラーが発生: {e}")
@@ -3,18 +3,29 @@ PubMed 引用数検索システム — OpenCitations COCI API 連携
 DOI ベースで合計引用数を取得する。
 """
 
-import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 
+import orjson
 import requests
 
 import config
+from database import cache_get, cache_put
+from rate_limiter import TokenBucket, get_with_retry, make_session
 
 logger = logging.getLogger(__name__)
 
 COCI_API_BASE = "https://opencitations.net/index/coci/api/v1/citations"
+COCI_COUNT_URL = "https://opencitations.net/index/coci/api/v1/citation-count"
+
+# 並列ワーカー間で共有する HTTP セッションとレートリミッタ
+_SESSION = make_session(pool_size=config.OPENCITATIONS_MAX_WORKERS, retries=3)
+_BUCKET = TokenBucket(rate=1.0 / config.OPENCITATIONS_WAIT_SEC)
+
+# プロセス内キャッシュ（SQLite キャッシュの手前に置く L1。取得成功した値のみ保持）
+_MEMORY_CACHE: dict[str, int] = {}
 
 
 def get_total_citations(doi: str) -> int | None:
@@ -31,15 +42,91 @@ def get_total_citations(doi: str) -> int | None:
         logger.debug("DOI が未指定のためスキップ")
         return None
 
-    citations = _fetch_citations(doi)
-    if citations is None:
+    # 引用レコードの一覧は不要なため、件数のみを返す citation-count エンドポイントを使う
+    data = _get_json(f"{COCI_COUNT_URL}/{doi}", doi)
+    if data is None:
+        return None
+
+    try:
+        total_count = int(data[0]["count"]) if data else 0
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        logger.error("OpenCitations 引用数の形式が不正です (DOI=%s): %s", doi, e)
+        return None
+
+    logger.info("DOI=%s: 合計引用数=%s", doi, total_count)
+    return total_count
+
+
+def get_total_citations_cached(doi: str, threshold: int | None = None) -> int | None:
+    """
+    get_total_citations の結果をキャッシュするラッパー。
+    プロセス内キャッシュ → SQLite キャッシュ（有効期限内のみ）→ API の順に参照する。
+
+    threshold を指定した場合、閾値から十分低いキャッシュは CITATION_CACHE_TTL_DAYS の間
+    そのまま使い、閾値付近のキャッシュは CITATION_NEAR_THRESHOLD_TTL_DAYS を過ぎたら
+    再取得する（閾値を超えた論文の検知が遅れないようにするため）。
+
+    Args:
+        doi: 論文の DOI
+        threshold: 判定に使う引用数の閾値（省略時は一律の有効期限）
+
+    Returns:
+        合計引用数。取得失敗時は None（失敗はキャッシュしない）。
+    """
+    if not doi:
         return None
 
-    total_count = len(citations)
-    logger.info(f"DOI={doi}: 合計引用数={total_count}")
+    cached = _MEMORY_CACHE.get(doi)
+    if cached is not None:
+        return cached
+
+    cached = cache_get(doi)
+    if (cached is not None and threshold is not None
+            and cached >= threshold - config.CITATION_NEAR_THRESHOLD_MARGIN):
+        cached = cache_get(doi, ttl_days=config.CITATION_NEAR_THRESHOLD_TTL_DAYS)
+    if cached is not None:
+        logger.debug("DOI=%s: キャッシュヒット (合計引用数=%s)", doi, cached)
+        _MEMORY_CACHE[doi] = cached
+        return cached
+
+    total_count = get_total_citations(doi)
+    if total_count is not None:
+        cache_put(doi, total_count)
+        _MEMORY_CACHE[doi] = total_count
     return total_count
 
 
+def get_total_citations_many(dois: list[str], threshold: int | None = None) -> dict[str, int | None]:
+    """
+    複数 DOI の合計引用数を並列に取得する（キャッシュ利用）。
+    レート制限はワーカー間で共有されるため、同時実行しても上限は超えない。
+
+    Args:
+        dois: DOI のリスト（重複・空値を含んでもよい）
+        threshold: 判定に使う引用数の閾値（get_total_citations_cached を参照）
+
+    Returns:
+        DOI → 合計引用数（取得失敗時は None）の辞書
+    """
+    unique_dois = list(dict.fromkeys(doi for doi in dois if doi))
+    results: dict[str, int | None] = {}
+    if not unique_dois:
+        return results
+
+    total = len(unique_dois)
+    with ThreadPoolExecutor(max_workers=config.OPENCITATIONS_MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(get_total_citations_cached, doi, threshold): doi
+            for doi in unique_dois
+        }
+        for idx, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if idx % 50 == 0:
+                logger.info("  進捗: %d/%d 件処理済み...", idx, total)
+
+    return results
+
+
 # get_citation_increase は本バージョンでは使用しません。
 # 合計引用数の取得には get_total_citations を使用してください。
 
@@ -47,6 +134,7 @@ def get_total_citations(doi: str) -> int | None:
 def _fetch_citations(doi: str) -> list[dict] | None:
     """
     OpenCitations COCI API から引用レコードを取得する。
+    （合計引用数のみが必要な場合は get_total_citations を使用すること）
 
     Args:
         doi: 論文の DOI
@@ -54,23 +142,34 @@ def _fetch_citations(doi: str) -> list[dict] | None:
     Returns:
         引用レコードのリスト。失敗時は None。
     """
-    url = f"{COCI_API_BASE}/{doi}"
+    data = _get_json(f"{COCI_API_BASE}/{doi}", doi)
+    if data is not None:
+        logger.info("OpenCitations: DOI=%s, %d 件の引用レコード取得", doi, len(data))
+    return data
+
 
+def _get_json(url: str, doi: str) -> list | None:
+    """
+    OpenCitations API に GET リクエストを送り、JSON を返す。
+    レート制限を守り、429 受信時は Retry-After の間リミッタ全体を止めてからリトライする。
+
+    Args:
+        url: リクエスト URL
+        doi: ログ出力用の DOI
+
+    Returns:
+        パース済みの JSON。失敗時は None。
+    """
     try:
-        resp = requests.get(url, timeout=60)
+        resp = get_with_retry(_SESSION, _BUCKET, url, "OpenCitations", timeout=60)
         resp.raise_for_status()
-        data = resp.json()
-        logger.info(f"OpenCitations: DOI={doi}, {len(data)} 件の引用レコード取得")
-        return data
+        return orjson.loads(resp.content)
     except requests.RequestException as e:
-        logger.error(f"OpenCitations API リクエスト失敗 (DOI={doi}): {e}")
+        logger.error("OpenCitations API リクエスト失敗 (DOI=%s): %s", doi, e)
         return None
-    except ValueError as e:
-        logger.error(f"OpenCitations JSON パース失敗 (DOI={doi}): {e}")
+    except orjson.JSONDecodeError as e:
+        logger.error("OpenCitations JSON パース失敗 (DOI=%s): %s", doi, e)
         return None
-    finally:
-        # レート制限遵守
-        time.sleep(config.OPENCITATIONS_WAIT_SEC)
 
 
 def _parse_creation_date(creation: str) -> date | None:
@@ -91,7 +190,15 @@ def _parse_creation_date(creation: str) -> date | None:
     if not creation:
         return None
 
-    parts = creation.strip().split("-")
+    creation = creation.strip()
+    # 大半を占める YYYY-MM-DD は C 実装の fromisoformat で直接パースする
+    if len(creation) == 10:
+        try:
+            return date.fromisoformat(creation)
+        except ValueError:
+            pass
+
+    parts = creation.split("-")
     try:
         if len(parts) == 3:
             return date(int(parts[0]), int(parts[1]), int(parts[2]))
@@ -101,8 +208,8 @@ def _parse_creation_date(creation: str) -> date | None:
         elif len(parts) == 1:
             return date(int(parts[0]), 1, 1)
         else:
-            logger.warning(f"不明な日付フォーマット: '{creation}'")
+            logger.warning("不明な日付フォーマット: '%s'", creation)
             return None
     except (ValueError, IndexError) as e:
-        logger.warning(f"日付パースエラー ('{creation}'): {e}")
+        logger.warning("日付パースエラー ('%s'): %s", creation, e)
         return None
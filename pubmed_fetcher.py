@@ -1,22 +1,55 @@
 """
 PubMed 引用数検索システム — PubMed API 連携
-E-utilities (esearch / efetch) で論文メタデータを取得する。
+E-utilities (esearch / efetch / esummary) で論文メタデータを取得する。
 """
 
-import time
 import logging
-import xml.etree.ElementTree as ET
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
+import orjson
 import requests
+from lxml import etree
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
 
 import config
+from rate_limiter import TokenBucket, get_with_retry, make_session
 
 logger = logging.getLogger(__name__)
 
 ESEARCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
 EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+ESUMMARY_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
+
+ESEARCH_RETMAX = 2000         # esearch 1 クエリあたりのデフォルト取得件数
+ESEARCH_MAX_RETMAX = 10000    # esearch で一度に取得できる上限件数
+
+# PubDate の英語月名 → 数値（記事ごとに作り直さないようモジュールレベルで保持）
+_MONTH_MAP = {
+    "Jan": "01", "Feb": "02", "Mar": "03", "Apr": "04",
+    "May": "05", "Jun": "06", "Jul": "07", "Aug": "08",
+    "Sep": "09", "Oct": "10", "Nov": "11", "Dec": "12",
+}
+
+# E-utilities 呼び出しで共有する HTTP セッション
+_SESSION = make_session(pool_size=config.PUBMED_MAX_WORKERS, retries=5)
+
+# 通信エラーとして扱う例外。resp.raw から直接ストリーム解析する場合、本文の読み込み中の
+# 切断・タイムアウトは requests に包まれず urllib3 の例外（ProtocolError など）のまま届く
+_REQUEST_ERRORS = (requests.RequestException, Urllib3HTTPError)
+
+# NCBI のレート上限（API キーなし 3 req/s、あり 10 req/s）に合わせたリミッタ
+_BUCKET = TokenBucket(rate=1.0 / config.PUBMED_WAIT_SEC)
+
+
+def _with_api_key(params: dict) -> dict:
+    """NCBI API キーが設定されていればパラメータに付加する。"""
+    if config.NCBI_API_KEY:
+        params["api_key"] = config.NCBI_API_KEY
+    return params
 
 
 def _build_date_range() -> tuple[str, str]:
@@ -34,7 +67,7 @@ def _build_date_range() -> tuple[str, str]:
 
 
 def search_pmids(mesh_query: str, mindate: str = None, maxdate: str = None,
-                 article_types: list[str] = None, retmax: int = 2000) -> list[str]:
+                 article_types: list[str] = None, retmax: int = ESEARCH_RETMAX) -> list[str]:
     """
     MeSH クエリで PubMed を検索し、PMID リストを返す。
 
@@ -43,7 +76,7 @@ def search_pmids(mesh_query: str, mindate: str = None, maxdate: str = None,
         mindate: 開始日 (YYYY/MM/DD)。None の場合は _build_date_range() を使用。
         maxdate: 終了日 (YYYY/MM/DD)。None の場合は _build_date_range() を使用。
         article_types: 対象とする Article Type のリスト。空の場合はフィルタなし。
-        retmax: 最大取得件数
+        retmax: 最大取得件数（ESEARCH_MAX_RETMAX を上限とする）
 
     Returns:
         PMID のリスト
@@ -58,38 +91,75 @@ def search_pmids(mesh_query: str, mindate: str = None, maxdate: str = None,
     if article_types:
         pt_filter = " OR ".join(f'"{at}"[pt]' for at in article_types)
         final_query = f"({mesh_query}) AND ({pt_filter})"
-        logger.info(f"  Article Type フィルタ: {article_types}")
+        logger.info("  Article Type フィルタ: %s", article_types)
 
-    params = {
+    params = _with_api_key({
         "db": "pubmed",
         "term": final_query,
         "datetype": "pdat",
         "mindate": mindate,
         "maxdate": maxdate,
-        "retmax": retmax,
+        "retmax": min(retmax, ESEARCH_MAX_RETMAX),
         "retmode": "xml",
-    }
+    })
 
-    logger.info(f"PubMed 検索: query='{final_query}', 期間={mindate}〜{maxdate}")
+    logger.info("PubMed 検索: query='%s', 期間=%s〜%s", final_query, mindate, maxdate)
 
     try:
-        resp = requests.get(ESEARCH_URL, params=params, timeout=30)
-        resp.raise_for_status()
-    except requests.RequestException as e:
-        logger.error(f"PubMed esearch リクエスト失敗: {e}")
+        # 応答全体を DOM 化せず、ソケットから直接ストリーム解析する
+        with get_with_retry(_SESSION, _BUCKET, ESEARCH_URL, "PubMed",
+                            params=params, stream=True, timeout=30) as resp:
+            resp.raise_for_status()
+            resp.raw.decode_content = True
+            pmids = _iter_ids(resp.raw)
+    except _REQUEST_ERRORS as e:
+        logger.error("PubMed esearch リクエスト失敗: %s", e)
+        return []
+    except etree.ParseError as e:
+        logger.error("PubMed esearch XML パース失敗: %s", e)
         return []
 
-    root = ET.fromstring(resp.text)
-    id_list = root.find("IdList")
-    if id_list is None:
+    if pmids is None:
         logger.warning("PubMed esearch: IdList が見つかりません")
         return []
 
-    pmids = [id_elem.text for id_elem in id_list.findall("Id") if id_elem.text]
-    logger.info(f"PubMed 検索結果: {len(pmids)} 件の PMID を取得")
+    logger.info("PubMed 検索結果: %d 件の PMID を取得", len(pmids))
     return pmids
 
 
+def _iter_ids(source: BinaryIO) -> list[str] | None:
+    """
+    esearch の XML をストリーム解析し、IdList/Id の PMID を返す。
+    IdList が存在しない場合は None。
+    """
+    # タグによる絞り込みは lxml の C 側で行う
+    events = etree.iterparse(source, events=("end",), tag=("Id", "IdList"))
+
+    pmids = []
+    found = False
+    for _, elem in events:
+        if elem.tag == "Id":
+            if elem.text:
+                pmids.append(elem.text)
+            elem.clear()
+        elif elem.tag == "IdList":
+            found = True
+            elem.clear()
+    return pmids if found else None
+
+
+def _fetch_in_batches(fetch_batch, pmids: list[str], batch_size: int) -> list[dict]:
+    """
+    PMID リストをバッチに分割し、スレッドプールで並列に取得する。
+    レート制限は _BUCKET で全スレッド共有のため、NCBI の上限は超えない。
+    結果は入力順に結合して返す。
+    """
+    batches = [pmids[i : i + batch_size] for i in range(0, len(pmids), batch_size)]
+    max_workers = min(config.PUBMED_MAX_WORKERS, len(batches))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [article for articles in executor.map(fetch_batch, batches) for article in articles]
+
+
 def fetch_article_details(pmids: list[str]) -> list[dict]:
     """
     PMID リストから各論文のメタデータを取得する。
@@ -104,44 +174,136 @@ def fetch_article_details(pmids: list[str]) -> list[dict]:
     if not pmids:
         return []
 
-    articles = []
-    batch_size = 100  # efetch は一度に最大 100 件
-
-    for i in range(0, len(pmids), batch_size):
-        batch = pmids[i : i + batch_size]
-        params = {
-            "db": "pubmed",
-            "id": ",".join(batch),
-            "retmode": "xml",
-        }
+    # efetch は一度に最大 100 件
+    articles = _fetch_in_batches(_fetch_details_batch, pmids, batch_size=100)
+    logger.info("PubMed efetch: %d 件の論文データを取得", len(articles))
+    return articles
+
 
-        try:
-            resp = requests.get(EFETCH_URL, params=params, timeout=60)
+def _fetch_details_batch(batch: list[str]) -> list[dict]:
+    """efetch で 1 バッチ分の論文データを取得する。失敗時は空リスト。"""
+    params = _with_api_key({
+        "db": "pubmed",
+        "id": ",".join(batch),
+        "retmode": "xml",
+    })
+
+    try:
+        # 本文全体を文字列化せず、ソケットから直接ストリーム解析する
+        with get_with_retry(_SESSION, _BUCKET, EFETCH_URL, "PubMed",
+                            params=params, stream=True, timeout=60) as resp:
             resp.raise_for_status()
-        except requests.RequestException as e:
-            logger.error(f"PubMed efetch リクエスト失敗: {e}")
-            continue
+            resp.raw.decode_content = True
+            return list(_iter_articles(resp.raw))
+    except _REQUEST_ERRORS as e:
+        logger.error("PubMed efetch リクエスト失敗: %s", e)
+        return []
+    except etree.ParseError as e:
+        logger.error("PubMed efetch XML パース失敗: %s", e)
+        return []
+
+
+def fetch_article_summaries(pmids: list[str]) -> list[dict]:
+    """
+    PMID リストから ESummary (JSON) で軽量なメタデータを取得する。
+    アブストラクトが不要な場合は efetch より転送量・パース量が大幅に少ない。
 
-        root = ET.fromstring(resp.text)
+    Args:
+        pmids: PMID のリスト
+
+    Returns:
+        論文情報の辞書リスト。各辞書は以下のキーを持つ:
+        - pmid, doi, title, journal, published_date
+    """
+    if not pmids:
+        return []
+
+    # esummary は一度に 200 件程度までが目安
+    articles = _fetch_in_batches(_fetch_summaries_batch, pmids, batch_size=200)
+    logger.info("PubMed esummary: %d 件の論文データを取得", len(articles))
+    return articles
 
-        for article_elem in root.findall(".//PubmedArticle"):
-            article = _parse_article(article_elem)
-            if article:
-                articles.append(article)
 
-        # レート制限遵守
-        time.sleep(config.PUBMED_WAIT_SEC)
+def _fetch_summaries_batch(batch: list[str]) -> list[dict]:
+    """esummary で 1 バッチ分の論文データを取得する。失敗時は空リスト。"""
+    params = _with_api_key({
+        "db": "pubmed",
+        "id": ",".join(batch),
+        "retmode": "json",
+    })
 
-    logger.info(f"PubMed efetch: {len(articles)} 件の論文データを取得")
+    try:
+        resp = get_with_retry(_SESSION, _BUCKET, ESUMMARY_URL, "PubMed",
+                              params=params, timeout=60)
+        resp.raise_for_status()
+        result = orjson.loads(resp.content).get("result", {})
+    except requests.RequestException as e:
+        logger.error("PubMed esummary リクエスト失敗: %s", e)
+        return []
+    except orjson.JSONDecodeError as e:
+        logger.error("PubMed esummary JSON パース失敗: %s", e)
+        return []
+
+    articles = []
+    for uid in result.get("uids", []):
+        article = _parse_summary(result.get(uid))
+        if article:
+            articles.append(article)
     return articles
 
 
-def _parse_article(article_elem: ET.Element) -> dict | None:
+def _parse_summary(summary: dict | None) -> dict | None:
+    """ESummary の 1 レコードから必要なメタデータを抽出する。"""
+    if not summary or "error" in summary:
+        return None
+
+    pmid = summary.get("uid")
+    if not pmid:
+        return None
+
+    doi = None
+    for article_id in summary.get("articleids", []):
+        if article_id.get("idtype") == "doi":
+            doi = article_id.get("value")
+            break
+
+    # sortpubdate は 'YYYY/MM/DD 00:00' 形式
+    sort_date = summary.get("sortpubdate", "")
+    published_date = sort_date[:10].replace("/", "-") if sort_date else "N/A"
+
+    return {
+        "pmid": pmid,
+        "doi": doi,
+        "title": summary.get("title") or "N/A",
+        "journal": summary.get("fulljournalname") or summary.get("source") or "N/A",
+        "published_date": published_date,
+    }
+
+
+def _iter_articles(source: BinaryIO) -> Iterator[dict]:
+    """
+    efetch の XML をストリーム解析し、PubmedArticle ごとにメタデータを返す。
+    解析済みの要素は都度解放するため、ピークメモリは 1 レコード分に収まる。
+    """
+    # タグによる絞り込みは lxml の C 側で行う
+    events = etree.iterparse(source, events=("end",), tag="PubmedArticle")
+
+    for _, elem in events:
+        article = _parse_article(elem)
+        elem.clear()
+        # 解析済みの兄弟要素も親から外し、空要素の蓄積を防ぐ
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+        if article:
+            yield article
+
+
+def _parse_article(article_elem: etree._Element) -> dict | None:
     """
     PubmedArticle XML 要素から必要なメタデータを抽出する。
     """
     try:
-        medline = article_elem.find(".//MedlineCitation")
+        medline = article_elem.find("MedlineCitation")
         if medline is None:
             return None
 
@@ -160,20 +322,20 @@ def _parse_article(article_elem: ET.Element) -> dict | None:
         title = title_elem.text if title_elem is not None else "N/A"
 
         # ジャーナル名
-        journal_elem = article.find(".//Journal/Title")
+        journal_elem = article.find("Journal/Title")
         journal = journal_elem.text if journal_elem is not None else "N/A"
 
         # DOI
         doi = None
-        for id_elem in article.findall(".//ELocationID"):
+        for id_elem in article.findall("ELocationID"):
             if id_elem.get("EIdType") == "doi":
                 doi = id_elem.text
                 break
         # ArticleId からも探索
         if not doi:
-            article_data = article_elem.find(".//PubmedData")
+            article_data = article_elem.find("PubmedData")
             if article_data is not None:
-                for id_elem in article_data.findall(".//ArticleId"):
+                for id_elem in article_data.findall("ArticleIdList/ArticleId"):
                     if id_elem.get("IdType") == "doi":
                         doi = id_elem.text
                         break
@@ -194,13 +356,13 @@ def _parse_article(article_elem: ET.Element) -> dict | None:
         }
 
     except Exception as e:
-        logger.error(f"論文データのパースに失敗: {e}")
+        logger.error("論文データのパースに失敗: %s", e)
         return None
 
 
-def _extract_pub_date(article_elem: ET.Element) -> str:
+def _extract_pub_date(article_elem: etree._Element) -> str:
     """公開日を抽出する（YYYY-MM-DD 形式）。"""
-    pub_date = article_elem.find(".//Journal/JournalIssue/PubDate")
+    pub_date = article_elem.find("Journal/JournalIssue/PubDate")
     if pub_date is None:
         return "N/A"
 
@@ -209,21 +371,21 @@ def _extract_pub_date(article_elem: ET.Element) -> str:
     day = pub_date.findtext("Day", "01")
 
     # 月が英語名の場合を数値に変換
-    month_map = {
-        "Jan": "01", "Feb": "02", "Mar": "03", "Apr": "04",
-        "May": "05", "Jun": "06", "Jul": "07", "Aug": "08",
-        "Sep": "09", "Oct": "10", "Nov": "11", "Dec": "12",
-    }
-    month = month_map.get(month, month)
+    month = _MONTH_MAP.get(month, month)
 
     if year:
-        return f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+        # 変換後はほぼ 2 桁のため、1 桁の場合のみゼロ埋めする
+        if len(month) == 1:
+            month = "0" + month
+        if len(day) == 1:
+            day = "0" + day
+        return f"{year}-{month}-{day}"
     return "N/A"
 
 
-def _extract_abstract(article_elem: ET.Element) -> str | None:
+def _extract_abstract(article_elem: etree._Element) -> str | None:
     """アブストラクトテキストを抽出する。構造化アブストラクトに対応。"""
-    abstract_elem = article_elem.find(".//Abstract")
+    abstract_elem = article_elem.find("Abstract")
     if abstract_elem is None:
         return None
 
@@ -0,0 +1,141 @@
+"""
+PubMed 引用数検索システム — レート制限
+複数スレッドから共有できるトークンバケット方式のレートリミッタと、
+それと協調する HTTP セッション・429 リトライ処理。
+"""
+
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# 429 (Too Many Requests) 受信時のリトライ回数
+MAX_RETRIES = 3
+
+
+def parse_retry_after(value: str | None, default: float = 1.0) -> float:
+    """Retry-After ヘッダの待機秒数を返す（未指定・日付形式の場合は default 秒）。"""
+    if value is None:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    """
+    トークンバケット方式のレートリミッタ（スレッドセーフ）。
+
+    rate 個/秒でトークンを補充し、最大 capacity 個まで貯める。
+    acquire() はトークンを 1 個消費し、不足している場合は補充されるまで待機する。
+    待機はロックの外で行うため、複数スレッドが同時に待っていても
+    全体の送出レートは rate を超えない。
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        """
+        Args:
+            rate: 1 秒あたりに許可するリクエスト数
+            capacity: バースト時に連続で許可するリクエスト数
+        """
+        if rate <= 0:
+            raise ValueError(f"rate は正の値である必要があります: {rate}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """トークンを 1 個取得する。必要なら補充されるまで待機する。"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # 不足分は前借りし、その分だけロック外で待機する
+            self._tokens -= 1
+            wait_sec = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait_sec > 0:
+            time.sleep(wait_sec)
+
+    def pause(self, seconds: float) -> None:
+        """
+        以降 seconds 秒間、全スレッドのトークン取得を止める。
+        429 の Retry-After を受けたときに呼び、サーバーの指示をワーカー全体で守る。
+        """
+        if seconds <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # 次の acquire() がちょうど seconds 秒待つよう、1 個分を差し引いた残高にする
+            # （既に前借りしている分より長い待機が必要なときだけ減らす）
+            self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+
+def make_session(pool_size: int, retries: int) -> requests.Session:
+    """
+    並列ワーカー間で共有する HTTP セッション（TCP/TLS 接続を再利用）を作る。
+    429 はレートリミッタと協調させるため get_with_retry 側で扱い、ここでは 5xx のみ再試行する。
+
+    Args:
+        pool_size: 接続プールの最大接続数（同時実行ワーカー数に合わせる）
+        retries: 5xx 応答・接続エラー時の最大再試行回数
+
+    Returns:
+        https:// にリトライ付きアダプタをマウントした requests.Session
+    """
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=0.5,
+                status_forcelist=[500, 502, 503, 504],
+            ),
+        ),
+    )
+    return session
+
+
+def get_with_retry(session: requests.Session, bucket: TokenBucket, url: str, label: str = "",
+                   **kwargs) -> requests.Response:
+    """
+    レート制限を守って GET リクエストを送り、レスポンスを返す。
+    429 受信時は Retry-After の間 bucket 全体を止めてから、最大 MAX_RETRIES 回まで送り直す。
+    （最後の試行の 429 はそのまま返すため、呼び出し側で raise_for_status() すること）
+
+    Args:
+        session: make_session で作ったセッション
+        bucket: リクエスト先と共有するレートリミッタ
+        url: リクエスト URL
+        label: ログ出力用のリクエスト先の名前
+        **kwargs: session.get に渡す引数
+
+    Returns:
+        requests.Response
+    """
+    for attempt in range(1, MAX_RETRIES + 1):
+        # レート制限遵守（スレッド間で共有）
+        bucket.acquire()
+        resp = session.get(url, **kwargs)
+        if resp.status_code != 429 or attempt == MAX_RETRIES:
+            return resp
+        wait_sec = parse_retry_after(resp.headers.get("Retry-After"))
+        logger.warning(
+            "%s 429: %.0f 秒後にリトライします (試行 %d/%d)", label, wait_sec, attempt, MAX_RETRIES,
+        )
+        resp.close()
+        # 待機はこのワーカーだけでなく、リミッタを共有する全ワーカーに適用する
+        bucket.pause(wait_sec)
+    return resp